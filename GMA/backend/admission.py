@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from config import settings
+import models
+import math
+import threading
+import time
+
+# admission.py
+#
+# Per-doctor admission control for the uploads and tests routers.
+# Everything lives in process memory so a check never costs a DB query;
+# storage usage is seeded from VideoUpload.file_size once per doctor and
+# kept up to date by the upload/delete endpoints afterwards.
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Try to take one token. Returns 0 on success, otherwise the number of
+        seconds until a token becomes available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float(settings.BUSY_RETRY_AFTER)
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[tuple[str, int], TokenBucket] = {}
+        self._active: dict[tuple[str, int], int] = {}
+        self._storage: dict[int, float] = {}
+
+    def _limits(self, kind: str):
+        if kind == "upload":
+            return settings.UPLOAD_RATE_PER_MINUTE, settings.UPLOAD_BURST, settings.MAX_CONCURRENT_UPLOADS
+        return settings.TEST_RATE_PER_MINUTE, settings.TEST_BURST, settings.MAX_CONCURRENT_TESTS
+
+    @contextmanager
+    def slot(self, kind: str, doctor_id: int):
+        """
+        Admit one `kind` ("upload" or "test") request for a doctor, holding a
+        concurrency slot until the block exits. Rejects with 429 + Retry-After.
+        """
+        rate, burst, max_active = self._limits(kind)
+        key = (kind, doctor_id)
+
+        with self._lock:
+            if self._active.get(key, 0) >= max_active:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Too many concurrent {kind}s (max {max_active})",
+                    headers={"Retry-After": str(settings.BUSY_RETRY_AFTER)}
+                )
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+            wait = bucket.take()
+            if wait > 0:
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Rate limit exceeded for {kind}s",
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))}
+                )
+
+            self._active[key] = self._active.get(key, 0) + 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active[key] -= 1
+                if self._active[key] <= 0:
+                    del self._active[key]
+
+    def ensure_storage_loaded(self, doctor_id: int, db: Session):
+        """Seed a doctor's storage usage from the database the first time it is needed."""
+        if doctor_id in self._storage:
+            return
+        used = db.query(func.coalesce(func.sum(models.VideoUpload.file_size), 0)).filter(
+            models.VideoUpload.doctor_id == doctor_id
+        ).scalar()
+        with self._lock:
+            self._storage.setdefault(doctor_id, float(used or 0))
+
+    def storage_used(self, doctor_id: int) -> float:
+        with self._lock:
+            return self._storage.get(doctor_id, 0.0)
+
+    def charge_storage(self, doctor_id: int, nbytes: float):
+        """
+        Count `nbytes` against the doctor's quota, rejecting with 413 if it
+        would be exceeded. Callers must refund_storage() on failure.
+        """
+        with self._lock:
+            used = self._storage.get(doctor_id, 0.0)
+            if used + nbytes > settings.STORAGE_QUOTA_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Storage quota exceeded (max {settings.STORAGE_QUOTA_BYTES / 1_000_000_000}GB)"
+                )
+            self._storage[doctor_id] = used + nbytes
+
+    def refund_storage(self, doctor_id: int, nbytes: float):
+        with self._lock:
+            if doctor_id in self._storage:
+                self._storage[doctor_id] = max(0.0, self._storage[doctor_id] - nbytes)
+
+
+admission = AdmissionController()
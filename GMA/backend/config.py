@@ -7,6 +7,22 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key")
     UPLOADS_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 1_500_000_000  # 1.5GB in bytes
+
+    # Admission control (per doctor, enforced in memory)
+    UPLOAD_RATE_PER_MINUTE: float = 10.0
+    UPLOAD_BURST: int = 5
+    TEST_RATE_PER_MINUTE: float = 20.0
+    TEST_BURST: int = 10
+    MAX_CONCURRENT_UPLOADS: int = 2
+    MAX_CONCURRENT_TESTS: int = 2
+    STORAGE_QUOTA_BYTES: int = 20_000_000_000  # 20GB in bytes
+    BUSY_RETRY_AFTER: int = 5  # seconds suggested when a concurrency cap is hit
+
+    # Cached GET responses are also invalidated on writes; TTL is a safety net
+    RESPONSE_CACHE_TTL: int = 300  # seconds
+
+    # Rows per CSV chunk / Parquet row group / Arrow record batch in exports
+    EXPORT_BATCH_SIZE: int = 10_000
     
     class Config:
         env_file = ".env"
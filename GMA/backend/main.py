@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from database import engine, Base
-from routers import auth, uploads, tests 
+from routers import auth, uploads, tests, exports
 import models
 from config import settings
 import uvicorn
@@ -47,6 +47,7 @@ def initialize_app(app: FastAPI):
     app.include_router(auth.router, prefix="/api/auth")
     app.include_router(uploads.router, prefix="/api/uploads") 
     app.include_router(tests.router, prefix="/api/tests") 
+    app.include_router(exports.router, prefix="/api/exports")
 
     @app.get("/")
     async def root():
@@ -0,0 +1,81 @@
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from config import settings
+from typing import Callable, Any
+import hashlib
+import json
+import threading
+import time
+
+# response_cache.py
+#
+# In-memory cache of rendered JSON bodies for read-heavy GET endpoints.
+# Entries are grouped by (scope, owner) - e.g. ("uploads", doctor_id) - so a
+# write can drop everything it affects with one invalidate() call. Each entry
+# carries a weak ETag so clients can revalidate and get an empty 304.
+
+
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, Any], dict[str, tuple[bytes, str, float]]] = {}
+
+    def get(self, scope: str, owner: Any, endpoint: str):
+        with self._lock:
+            entry = self._entries.get((scope, owner), {}).get(endpoint)
+        if entry is None:
+            return None
+        body, etag, stored_at = entry
+        if time.monotonic() - stored_at > settings.RESPONSE_CACHE_TTL:
+            return None
+        return body, etag
+
+    def put(self, scope: str, owner: Any, endpoint: str, content: Any):
+        body = json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        with self._lock:
+            self._entries.setdefault((scope, owner), {})[endpoint] = (body, etag, time.monotonic())
+        return body, etag
+
+    def invalidate(self, scope: str, owner: Any):
+        with self._lock:
+            self._entries.pop((scope, owner), None)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison: W/"x" and "x" are treated as the same validator
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def cached_json_response(
+    request: Request,
+    scope: str,
+    owner: Any,
+    endpoint: str,
+    build: Callable[[], Any],
+) -> Response:
+    """
+    Serve `endpoint` for `owner` from the cache, calling `build` (query and
+    serialization) only on a miss. Answers 304 when If-None-Match matches.
+    """
+    cached = response_cache.get(scope, owner, endpoint)
+    if cached is None:
+        cached = response_cache.put(scope, owner, endpoint, build())
+    body, etag = cached
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
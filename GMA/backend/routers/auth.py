@@ -6,11 +6,12 @@ from firebase_auth import get_current_user
 
 # routers/auth.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database import get_db
 import models, schemas
 from firebase_auth import get_current_user
+from response_cache import cached_json_response, response_cache
 
 router = APIRouter(tags=["auth"])
 
@@ -41,21 +42,27 @@ async def create_or_update_profile(
     
     db.commit()
     db.refresh(doctor)
+    response_cache.invalidate("profile", firebase_uid)
     # The response now includes the updated database profile
     return doctor # FastAPI/Pydantic automatically uses schemas.Doctor.from_orm(doctor)
 
 @router.get("/profile") # ADDED response_model for clarity
 
 async def get_profile(
+    request: Request,
     user_token: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     firebase_uid = user_token.get("uid")
-    doctor = db.query(models.Doctor).filter(
-        models.Doctor.firebase_uid == firebase_uid
-    ).first()
-    
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor profile not found")
-    
-    return schemas.Doctor.from_orm(doctor)
+
+    def build():
+        doctor = db.query(models.Doctor).filter(
+            models.Doctor.firebase_uid == firebase_uid
+        ).first()
+
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+        return schemas.Doctor.from_orm(doctor)
+
+    return cached_json_response(request, "profile", firebase_uid, "profile", build)
@@ -0,0 +1,250 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from database import SessionLocal
+import models
+from config import settings
+from routers.uploads import get_doctor_id
+from datetime import date, datetime, time, timezone
+from itertools import islice
+from typing import Optional, Union
+import csv
+import io
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# routers/exports.py
+#
+# Bulk export of classification results and upload metadata. Rows are read
+# through a server-side cursor and written out one batch (CSV chunk, Parquet
+# row group or Arrow record batch) at a time, so memory stays bounded.
+
+router = APIRouter(tags=["exports"])
+
+RISK_LABELS = ("high-risk", "uncertain", "low-risk")
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# (column name, arrow type alias)
+RESULT_COLUMNS = [
+    ("test_id", "int64"),
+    ("test_type", "string"),
+    ("uploaded_at", "timestamp[us]"),
+    ("video_id", "int64"),
+    ("video_filename", "string"),
+    ("math_classifier", "int64"),
+    ("dl_classifier", "int64"),
+    ("final_result", "int64"),
+    ("status", "string"),
+]
+
+UPLOAD_COLUMNS = [
+    ("id", "int64"),
+    ("filename", "string"),
+    ("original_filename", "string"),
+    ("file_size", "double"),
+    ("upload_time", "timestamp[us]"),
+    ("status", "string"),
+]
+
+
+def _result_rows(db, doctor_id: int, start, end, risk):
+    """One row per classified video, flattened out of BlindTest.results."""
+    query = db.query(
+        models.BlindTest.id,
+        models.BlindTest.test_type,
+        models.BlindTest.uploaded_at,
+        models.BlindTest.results,
+    ).filter(models.BlindTest.doctor_id == doctor_id)
+    if start:
+        query = query.filter(models.BlindTest.uploaded_at >= start)
+    if end:
+        query = query.filter(models.BlindTest.uploaded_at < end)
+    query = query.order_by(models.BlindTest.id).execution_options(
+        stream_results=True
+    ).yield_per(settings.EXPORT_BATCH_SIZE)
+
+    for test_id, test_type, uploaded_at, results in query:
+        for result in json.loads(results or "[]"):
+            if risk and result.get("status") != risk:
+                continue
+            yield {
+                "test_id": test_id,
+                "test_type": test_type,
+                "uploaded_at": uploaded_at,
+                "video_id": result.get("video_id"),
+                "video_filename": result.get("video_filename"),
+                "math_classifier": result.get("math_classifier"),
+                "dl_classifier": result.get("dl_classifier"),
+                "final_result": result.get("final_result"),
+                "status": result.get("status"),
+            }
+
+
+def _upload_rows(db, doctor_id: int, start, end):
+    query = db.query(
+        *(getattr(models.VideoUpload, name) for name, _ in UPLOAD_COLUMNS)
+    ).filter(models.VideoUpload.doctor_id == doctor_id)
+    if start:
+        query = query.filter(models.VideoUpload.upload_time >= start)
+    if end:
+        query = query.filter(models.VideoUpload.upload_time < end)
+    query = query.order_by(models.VideoUpload.id).execution_options(
+        stream_results=True
+    ).yield_per(settings.EXPORT_BATCH_SIZE)
+
+    for row in query:
+        yield row._asdict()
+
+
+def _batches(rows):
+    while batch := list(islice(rows, settings.EXPORT_BATCH_SIZE)):
+        yield batch
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _stream_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                row[name].isoformat() if isinstance(row[name], datetime) else row[name]
+                for name, _ in columns
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _stream_arrow(columns, batches, fmt: str):
+    schema = pa.schema([(name, pa.type_for_alias(alias)) for name, alias in columns])
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    try:
+        for batch in batches:
+            table = pa.Table.from_pylist(batch, schema=schema)
+            write(table if fmt == "parquet" else table.to_batches()[0])
+            if chunk := sink.drain():
+                yield chunk
+    finally:
+        writer.close()
+    if chunk := sink.drain():
+        yield chunk
+
+
+def _as_utc(value: Optional[Union[datetime, date]]) -> Optional[datetime]:
+    """
+    Timestamps are stored as naive UTC; convert a bound to match. A plain
+    date means midnight UTC on that day.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time.min)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _export(name: str, fmt: str, start, end, columns, make_rows):
+    start, end = _as_utc(start), _as_utc(end)
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt} (use csv, parquet or arrow)")
+
+    media_type, extension = FORMATS[fmt]
+
+    def body():
+        # Own session: the export outlives the request-scoped one from get_db
+        db = SessionLocal()
+        try:
+            batches = _batches(make_rows(db, start, end))
+            if fmt == "csv":
+                yield from _stream_csv(columns, batches)
+            else:
+                yield from _stream_arrow(columns, batches, fmt)
+        finally:
+            db.close()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={name}_{timestamp}.{extension}"}
+    )
+
+
+@router.get("/results")
+async def export_results(
+    fmt: str = Query("csv", alias="format"),
+    start: Optional[Union[datetime, date]] = None,
+    end: Optional[Union[datetime, date]] = None,
+    risk: Optional[str] = None,
+    doctor_id: int = Depends(get_doctor_id)
+):
+    """
+    Stream per-video classification results of the doctor's blind tests,
+    optionally filtered by test date range [start, end) and risk label.
+    """
+    if risk and risk not in RISK_LABELS:
+        raise HTTPException(status_code=400, detail=f"Unknown risk label: {risk}")
+
+    return _export(
+        "results", fmt, start, end, RESULT_COLUMNS,
+        lambda db, start, end: _result_rows(db, doctor_id, start, end, risk)
+    )
+
+
+@router.get("/uploads")
+async def export_uploads(
+    fmt: str = Query("csv", alias="format"),
+    start: Optional[Union[datetime, date]] = None,
+    end: Optional[Union[datetime, date]] = None,
+    doctor_id: int = Depends(get_doctor_id)
+):
+    """
+    Stream the doctor's upload metadata, optionally filtered by upload date range [start, end).
+    """
+    return _export(
+        "uploads", fmt, start, end, UPLOAD_COLUMNS,
+        lambda db, start, end: _upload_rows(db, doctor_id, start, end)
+    )
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from database import get_db
 import models, schemas
 from firebase_auth import get_current_user
+from admission import admission
+from response_cache import cached_json_response, response_cache
 from datetime import datetime
 import json
 import random
@@ -33,6 +36,14 @@ async def get_doctor_id(
     
     return doctor.id
 
+async def admit_test(doctor_id: int = Depends(get_doctor_id)):
+    """
+    Admission control for classification jobs: rate limit and concurrency cap.
+    The concurrency slot is held for the request.
+    """
+    with admission.slot("test", doctor_id):
+        yield doctor_id
+
 def simulate_classification(video_id: int, video_filename: str) -> dict:
     """
     Simulate running classification on a video.
@@ -52,10 +63,14 @@ def simulate_classification(video_id: int, video_filename: str) -> dict:
         "status": "high-risk" if final_score >= 70 else "uncertain" if final_score >= 40 else "low-risk"
     }
 
+def classify_videos(videos: list[tuple[int, str]]) -> list[dict]:
+    """Run classification on each (video_id, filename) pair; blocking, call from a worker thread."""
+    return [simulate_classification(video_id, filename) for video_id, filename in videos]
+
 @router.post("/instant")
 async def create_instant_test(
     test_data: schemas.BlindTestCreate,
-    doctor_id: int = Depends(get_doctor_id),
+    doctor_id: int = Depends(admit_test),
     db: Session = Depends(get_db)
 ):
     try:
@@ -78,11 +93,11 @@ async def create_instant_test(
             print(f"Error: No videos found for doctor_id {doctor_id} with ids {test_data.video_ids}")
             raise HTTPException(status_code=404, detail="No videos found")
         
-        # Run classification on each video
-        results = []
-        for video in videos:
-            classification = simulate_classification(video.id, video.original_filename)
-            results.append(classification)
+        # Run classification on each video in a worker thread, so the event
+        # loop stays free and the admission slot is held while the job runs
+        results = await run_in_threadpool(
+            classify_videos, [(video.id, video.original_filename) for video in videos]
+        )
         
         print(f"Generated {len(results)} classifications")
         
@@ -97,6 +112,7 @@ async def create_instant_test(
         db.add(blind_test)
         db.commit()
         db.refresh(blind_test)
+        response_cache.invalidate("tests", doctor_id)
         print(f"Test created: {blind_test.id}")
         return schemas.BlindTest.from_orm(blind_test)
     except HTTPException:
@@ -111,7 +127,7 @@ async def create_instant_test(
 @router.post("/full")
 async def create_full_test(
     test_data: schemas.BlindTestCreate,
-    doctor_id: int = Depends(get_doctor_id),
+    doctor_id: int = Depends(admit_test),
     db: Session = Depends(get_db)
 ):
     try:
@@ -134,11 +150,11 @@ async def create_full_test(
             print(f"Error: No videos found for doctor_id {doctor_id} with ids {test_data.video_ids}")
             raise HTTPException(status_code=404, detail="No videos found")
         
-        # Run classification on each video
-        results = []
-        for video in videos:
-            classification = simulate_classification(video.id, video.original_filename)
-            results.append(classification)
+        # Run classification on each video in a worker thread, so the event
+        # loop stays free and the admission slot is held while the job runs
+        results = await run_in_threadpool(
+            classify_videos, [(video.id, video.original_filename) for video in videos]
+        )
         
         print(f"Generated {len(results)} classifications")
         
@@ -153,6 +169,7 @@ async def create_full_test(
         db.add(blind_test)
         db.commit()
         db.refresh(blind_test)
+        response_cache.invalidate("tests", doctor_id)
         print(f"Test created: {blind_test.id}")
         return schemas.BlindTest.from_orm(blind_test)
     except HTTPException:
@@ -166,11 +183,15 @@ async def create_full_test(
 
 @router.get("/history")
 async def get_test_history(
+    request: Request,
     doctor_id: int = Depends(get_doctor_id),
     db: Session = Depends(get_db)
 ):
-    tests = db.query(models.BlindTest).filter(
-        models.BlindTest.doctor_id == doctor_id
-    ).order_by(models.BlindTest.uploaded_at.desc()).all()
-    
-    return [schemas.BlindTest.from_orm(t) for t in tests]
+    def build():
+        tests = db.query(models.BlindTest).filter(
+            models.BlindTest.doctor_id == doctor_id
+        ).order_by(models.BlindTest.uploaded_at.desc()).all()
+
+        return [schemas.BlindTest.from_orm(t) for t in tests]
+
+    return cached_json_response(request, "tests", doctor_id, "history", build)
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from database import get_db
 import models, schemas
 from firebase_auth import get_current_user
 from config import settings
+from admission import admission
+from response_cache import cached_json_response, response_cache
+from multipart.multipart import parse_options_header
+import multipart
 import os
 from datetime import datetime
 
@@ -26,99 +30,226 @@ async def get_doctor_id(
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     return doctor.id
-@router.get("/", )
-async def get_all_uploads(
+
+async def admit_upload(
+    request: Request,
     doctor_id: int = Depends(get_doctor_id),
     db: Session = Depends(get_db)
 ):
     """
-    Retrieve all video uploads for the current authenticated doctor.
+    Admission control for new uploads: rate limit, concurrency cap and a
+    fast storage quota check against Content-Length. Runs before any of the
+    body is read; the concurrency slot is held for the request.
     """
-    # Query all uploads for the doctor, ordered by most recent first
-    videos = db.query(models.VideoUpload).filter(
-        models.VideoUpload.doctor_id == doctor_id
-    ).order_by(models.VideoUpload.upload_time.desc()).all()
-    
-    return videos
+    admission.ensure_storage_loaded(doctor_id, db)
+    incoming = int(request.headers.get("content-length") or 0)
+    if admission.storage_used(doctor_id) + incoming > settings.STORAGE_QUOTA_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Storage quota exceeded (max {settings.STORAGE_QUOTA_BYTES / 1_000_000_000}GB)"
+        )
+    with admission.slot("upload", doctor_id):
+        yield doctor_id
 
-@router.post("/")
-async def upload_videos(
-    files: list[UploadFile] = File(...),
-    doctor_id: int = Depends(get_doctor_id),
-    db: Session = Depends(get_db)
-):
-    uploaded_videos = []
-    
-    for file in files:
+class VideoStreamWriter:
+    """
+    Writes the `files` parts of a multipart body straight into UPLOADS_DIR as
+    they arrive, charging every chunk against the doctor's storage quota and
+    saving each finished file to the database.
+    """
+
+    def __init__(self, boundary: bytes, doctor_id: int, db: Session):
+        self.doctor_id = doctor_id
+        self.db = db
+        self.uploaded_videos = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._buffer = None
+        self._parser = multipart.MultipartParser(boundary, callbacks={
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+    def write(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def finalize(self):
+        self._parser.finalize()
+        # A body that ends before the closing boundary leaves the last file open;
+        # upload_videos aborts it, which removes the file and refunds its quota
+        if self._buffer is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Incomplete upload: {self.original_filename}"
+            )
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._headers = {}
+        # Ignore anything that is not a file in the `files` field
+        if options.get(b"name") != b"files" or b"filename" not in options:
+            return
+
+        try:
+            self.original_filename = options[b"filename"].decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Filename must be valid UTF-8")
         # Check file type
-        if not file.filename.lower().endswith(('.mov', '.mp4')):
+        if not self.original_filename.lower().endswith(('.mov', '.mp4')):
             raise HTTPException(
                 status_code=400, 
-                detail=f"Only .mov or .mp4 files allowed: {file.filename}"
+                detail=f"Only .mov or .mp4 files allowed: {self.original_filename}"
             )
 
         # Generate safe filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join(settings.UPLOADS_DIR, safe_filename)
+        self.safe_filename = f"{timestamp}_{self.original_filename}"
+        self.file_path = os.path.join(settings.UPLOADS_DIR, self.safe_filename)
+        self.file_size = 0
+        self._buffer = open(self.file_path, "wb")
 
-        try:
-            # Write file in chunks to handle large files
-            file_size = 0
-            with open(file_path, "wb") as buffer:
-                while chunk := await file.read(1024 * 1024):  # 1MB chunks
-                    file_size += len(chunk)
-                    
-                    # Check file size limit
-                    if file_size > settings.MAX_FILE_SIZE:
-                        # Clean up partial file
-                        buffer.close()
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        raise HTTPException(
-                            status_code=413,
-                            detail=f"File too large: {file.filename} (max {settings.MAX_FILE_SIZE / 1_000_000_000}GB)"
-                        )
-                    
-                    buffer.write(chunk)
-                
-        except HTTPException:
-            raise
-        except Exception as e:
-            # Clean up on error
-            if os.path.exists(file_path):
-                os.remove(file_path)
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._buffer is None:
+            return
+        chunk = data[start:end]
+
+        # Check file size limit
+        if self.file_size + len(chunk) > settings.MAX_FILE_SIZE:
             raise HTTPException(
-                status_code=500, 
-                detail=f"File write error: {str(e)}"
+                status_code=413,
+                detail=f"File too large: {self.original_filename} (max {settings.MAX_FILE_SIZE / 1_000_000_000}GB)"
             )
 
+        # Count the chunk against the doctor's storage quota
+        admission.charge_storage(self.doctor_id, len(chunk))
+        self.file_size += len(chunk)
+
+        self._buffer.write(chunk)
+
+    def on_part_end(self):
+        if self._buffer is None:
+            return
+        self._buffer.close()
+        self._buffer = None
+
         # Save to database
         db_video = models.VideoUpload(
-            doctor_id=doctor_id,
-            filename=safe_filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
+            doctor_id=self.doctor_id,
+            filename=self.safe_filename,
+            original_filename=self.original_filename,
+            file_path=self.file_path,
+            file_size=self.file_size,
             status="uploaded"
         )
-        db.add(db_video)
-        db.commit()
-        db.refresh(db_video)
-        uploaded_videos.append(db_video)
+        self.db.add(db_video)
+        self.db.commit()
+        self.db.refresh(db_video)
+        self.uploaded_videos.append(db_video)
+
+    def abort(self):
+        """Clean up the partially written file and give back the quota it used."""
+        if self._buffer is None:
+            return
+        self._buffer.close()
+        self._buffer = None
+        admission.refund_storage(self.doctor_id, self.file_size)
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+@router.get("/", )
+async def get_all_uploads(
+    request: Request,
+    doctor_id: int = Depends(get_doctor_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Retrieve all video uploads for the current authenticated doctor.
+    """
+    def build():
+        # Query all uploads for the doctor, ordered by most recent first
+        return db.query(models.VideoUpload).filter(
+            models.VideoUpload.doctor_id == doctor_id
+        ).order_by(models.VideoUpload.upload_time.desc()).all()
 
-    return uploaded_videos
+    return cached_json_response(request, "uploads", doctor_id, "list", build)
+
+# The body is parsed by hand so that admit_upload runs before it is read;
+# declaring File(...) parameters would make FastAPI spool it to disk first.
+@router.post("/", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["files"],
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+        }}},
+    },
+})
+async def upload_videos(
+    request: Request,
+    doctor_id: int = Depends(admit_upload),
+    db: Session = Depends(get_db)
+):
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    writer = VideoStreamWriter(options[b"boundary"], doctor_id, db)
+    try:
+        async for chunk in request.stream():
+            writer.write(chunk)
+        writer.finalize()
+    except Exception as e:
+        writer.abort()
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(
+            status_code=500, 
+            detail=f"File write error: {str(e)}"
+        )
+    finally:
+        if writer.uploaded_videos:
+            response_cache.invalidate("uploads", doctor_id)
+
+    if not writer.uploaded_videos:
+        raise HTTPException(status_code=400, detail="No files provided")
+
+    # Each commit expires the videos saved before it; reload them for the response
+    for video in writer.uploaded_videos:
+        db.refresh(video)
+
+    return writer.uploaded_videos
 
 @router.get("/history")
 async def get_upload_history(
+    request: Request,
     doctor_id: int = Depends(get_doctor_id),
     db: Session = Depends(get_db)
 ):
-    videos = db.query(models.VideoUpload).filter(
-        models.VideoUpload.doctor_id == doctor_id
-    ).order_by(models.VideoUpload.uploaded_at.desc()).all()
-    
-    return [schemas.VideoUpload.from_orm(v) for v in videos]
+    def build():
+        videos = db.query(models.VideoUpload).filter(
+            models.VideoUpload.doctor_id == doctor_id
+        ).order_by(models.VideoUpload.upload_time.desc()).all()
+
+        return [schemas.VideoUpload.from_orm(v) for v in videos]
+
+    return cached_json_response(request, "uploads", doctor_id, "history", build)
 
 @router.delete("/{upload_id}")
 async def delete_upload(
@@ -139,8 +270,11 @@ async def delete_upload(
         os.remove(video.file_path)
     
     # Delete from database
+    admission.ensure_storage_loaded(doctor_id, db)
     db.delete(video)
     db.commit()
+    admission.refund_storage(doctor_id, video.file_size or 0)
+    response_cache.invalidate("uploads", doctor_id)
     
     return {"message": "Video deleted successfully"}
 
@@ -164,6 +298,7 @@ async def update_upload(
     
     db.commit()
     db.refresh(video)
+    response_cache.invalidate("uploads", doctor_id)
     
     return schemas.VideoUpload.from_orm(video)
 